@@ -0,0 +1,87 @@
+"""HTTP validators (ETag / Last-Modified) and cache headers."""
+
+import hashlib
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
+
+# Polled endpoints: always revalidate, but a match costs a 304 and no body
+REVALIDATE = "no-cache"
+# /static assets
+STATIC_MAX_AGE = 7 * 24 * 3600
+
+
+_SAFE = re.compile(r"^[\w.]*$")
+
+
+def _etag_part(part) -> str:
+    part = str(part)
+    return part if _SAFE.match(part) else hashlib.sha1(part.encode("utf-8")).hexdigest()[:12]
+
+
+def etag(*parts) -> str:
+    """Weak ETag from version parts (weak: gzip/brotli change the bytes).
+
+    Parts that aren't plain word characters (e.g. a source filter) are hashed.
+    """
+    return 'W/"' + "-".join(_etag_part(p) for p in parts) + '"'
+
+
+def _etag_matches(header: str, tag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(request: Request, tag: str, last_modified: Optional[float]) -> bool:
+    """True if the request's validators show the client's copy is current."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, tag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def validator_headers(tag: str, last_modified: Optional[float], cache_control: str = REVALIDATE) -> dict:
+    headers = {"ETag": tag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def cached_json(request: Request, tag: str, last_modified: Optional[float], build: Callable[[], dict]) -> Response:
+    """304 if the client is current, otherwise build() as JSON with validators.
+
+    build is only called on a miss, so a matching poll never touches the store.
+    """
+    headers = validator_headers(tag, last_modified)
+    if not_modified(request, tag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build(), headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with a long-lived Cache-Control on successful responses."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}"
+        return response
@@ -1,9 +1,36 @@
 """Configuration for Charles API."""
 
+import logging
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
+TIERS = ("store", "classify", "reply")
+
+
+def _parse_source_tiers(value: str) -> dict:
+    """Parse "claude-code=store,alerts=classify" into {source: tier}."""
+    tiers = {}
+    for pair in value.split(","):
+        source, _, tier = pair.partition("=")
+        tier = tier.strip().lower()
+        if source.strip() and tier in TIERS:
+            tiers[source.strip()] = tier
+        elif pair.strip():
+            logger.warning(f"Ignoring SOURCE_TIERS entry {pair.strip()!r} (tiers: {', '.join(TIERS)})")
+    return tiers
+
+
+def _parse_tier(value: str, default: str = "reply") -> str:
+    """A tier name, case-insensitively; an unknown one falls back to default."""
+    tier = value.strip().lower()
+    if tier in TIERS:
+        return tier
+    logger.warning(f"Unknown DEFAULT_TIER {value!r}, using {default!r} (tiers: {', '.join(TIERS)})")
+    return default
+
 
 @dataclass
 class Config:
@@ -18,12 +45,43 @@ class Config:
     telegram_bot_token: Optional[str] = None
     telegram_chat_id: Optional[str] = None
 
+    # /message processing tiers: store (remember only), classify (+ notify
+    # decision), reply (+ chat reply). Defaults per source, then overall.
+    default_tier: str = "reply"
+    source_tiers: dict = field(default_factory=lambda: {"claude-code": "store"})
+
+    # Per-tier Bedrock budgets
+    classify_max_tokens: int = 256
+    classify_timeout: float = 10
+    reply_max_tokens: int = 1024
+    reply_timeout: float = 30
+
     # Notification limits
     max_notifications_per_day: int = 3
 
     # Data paths (server-side)
     data_dir: str = "/opt/charles/data"
 
+    # Ingest dedupe: fold repeats of a message (same source, same text up to
+    # case/whitespace) seen within this many seconds, looking back at most
+    # this many records. 0 disables folding. dedupe_ignore_numbers also folds
+    # messages differing only in digits (counters, ids) -- but "v1.2.3" and
+    # "v1.2.4" too, so it's opt-in.
+    dedupe_window_seconds: int = 600
+    dedupe_lookback: int = 200
+    dedupe_ignore_numbers: bool = False
+
+    # Group commit: the writer waits up to write_max_delay_ms after the first
+    # queued write for more, and commits at most write_batch_max per fsync
+    write_max_delay_ms: float = 5
+    write_batch_max: int = 256
+
+    # Drop memory partitions (source x month) older than this many months; 0 keeps all
+    retention_months: int = 0
+
+    # Idempotency keys remembered per namespace (batch replay, webhooks)
+    seen_max_keys: int = 10000
+
     # API
     api_host: str = "0.0.0.0"
     api_port: int = 8000
@@ -36,8 +94,21 @@ class Config:
             bedrock_model=os.getenv("BEDROCK_MODEL", "anthropic.claude-3-haiku-20240307-v1:0"),
             telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN"),
             telegram_chat_id=os.getenv("TELEGRAM_CHAT_ID"),
+            default_tier=_parse_tier(os.getenv("DEFAULT_TIER", "reply")),
+            source_tiers=_parse_source_tiers(os.getenv("SOURCE_TIERS", "claude-code=store")),
+            classify_max_tokens=int(os.getenv("CLASSIFY_MAX_TOKENS", "256")),
+            classify_timeout=float(os.getenv("CLASSIFY_TIMEOUT", "10")),
+            reply_max_tokens=int(os.getenv("REPLY_MAX_TOKENS", "1024")),
+            reply_timeout=float(os.getenv("REPLY_TIMEOUT", "30")),
             max_notifications_per_day=int(os.getenv("MAX_NOTIFICATIONS_PER_DAY", "3")),
             data_dir=os.getenv("CHARLES_DATA_DIR", "/opt/charles/data"),
+            dedupe_window_seconds=int(os.getenv("DEDUPE_WINDOW_SECONDS", "600")),
+            dedupe_lookback=int(os.getenv("DEDUPE_LOOKBACK", "200")),
+            dedupe_ignore_numbers=os.getenv("DEDUPE_IGNORE_NUMBERS", "").lower() in ("1", "true", "yes"),
+            write_max_delay_ms=float(os.getenv("WRITE_MAX_DELAY_MS", "5")),
+            write_batch_max=int(os.getenv("WRITE_BATCH_MAX", "256")),
+            retention_months=int(os.getenv("RETENTION_MONTHS", "0")),
+            seen_max_keys=int(os.getenv("SEEN_MAX_KEYS", "10000")),
             api_host=os.getenv("API_HOST", "0.0.0.0"),
             api_port=int(os.getenv("API_PORT", "8000")),
         )
@@ -16,12 +16,20 @@ BEDROCK_URL = (
     f"/model/{config.bedrock_model}/invoke"
 )
 
+# Pooled keep-alive connections to Bedrock, shared by all requests
+_session = requests.Session()
 
-def _call_haiku(prompt: str, max_tokens: int = 1024) -> str:
+
+def warm_connection():
+    """Open (and pool) a TLS connection to Bedrock ahead of the first call."""
+    _session.head(f"https://bedrock-runtime.{config.aws_region}.amazonaws.com", timeout=5)
+
+
+def _call_haiku(prompt: str, max_tokens: int = 1024, timeout: float = 30) -> str:
     if not config.aws_bearer_token:
         raise RuntimeError("AWS_BEARER_TOKEN_BEDROCK not set")
 
-    response = requests.post(
+    response = _session.post(
         BEDROCK_URL,
         headers={
             "Authorization": f"Bearer {config.aws_bearer_token}",
@@ -32,7 +40,7 @@ def _call_haiku(prompt: str, max_tokens: int = 1024) -> str:
             "max_tokens": max_tokens,
             "messages": [{"role": "user", "content": prompt}],
         },
-        timeout=30,
+        timeout=timeout,
     )
 
     if response.status_code != 200:
@@ -43,7 +51,15 @@ def _call_haiku(prompt: str, max_tokens: int = 1024) -> str:
     return result.get("content", [{}])[0].get("text", "")
 
 
-def classify_message(message: str) -> dict:
+def _seen(m: dict) -> str:
+    """Occurrence suffix for a memory line: " (ts)" or " ×N (first → last)"."""
+    count = m.get("count", 1)
+    if count > 1:
+        return f" ×{count} ({m['timestamp']} → {m.get('last_seen', m['timestamp'])})"
+    return f" ({m['timestamp']})"
+
+
+def classify_message(message: str, max_tokens: int = 256, timeout: float = 30) -> dict:
     """Classify whether a message should trigger a notification.
 
     Returns: {"notify": bool, "reason": str, "summary": str}
@@ -56,7 +72,7 @@ def classify_message(message: str) -> dict:
     if recent_memories:
         memories_text = "Recent memories (last 20):\n"
         for m in recent_memories:
-            memories_text += f"- {m['text']} ({m['timestamp']})\n"
+            memories_text += f"- {m['text']}{_seen(m)}\n"
 
     responses_text = ""
     if recent_responses:
@@ -94,7 +110,7 @@ Respond ONLY as JSON (no other text):
 {{"notify": true/false, "reason": "brief explanation", "summary": "1-line notification text"}}"""
 
     start = time.time()
-    raw = _call_haiku(prompt, max_tokens=256)
+    raw = _call_haiku(prompt, max_tokens=max_tokens, timeout=timeout)
     latency_ms = int((time.time() - start) * 1000)
     logger.info(f"Haiku classification took {latency_ms}ms")
 
@@ -113,7 +129,7 @@ Respond ONLY as JSON (no other text):
     return result
 
 
-def chat_response(message: str) -> str:
+def chat_response(message: str, max_tokens: int = 1024, timeout: float = 30) -> str:
     """Generate a chat response using Haiku with memory context."""
     manifest = load_manifest()
     recent_memories = get_recent_memories(20)
@@ -124,7 +140,7 @@ def chat_response(message: str) -> str:
         memories_text = "Your memories (most recent):\n"
         for m in recent_memories:
             src = f" [{m['source']}]" if m.get("source") else ""
-            memories_text += f"- {m['text']}{src} ({m['timestamp']})\n"
+            memories_text += f"- {m['text']}{src}{_seen(m)}\n"
 
     responses_text = ""
     if recent_responses:
@@ -145,4 +161,4 @@ Charles Dana's rules:
 {memories_text}
 
 Charles Dana says: {message}"""
-    return _call_haiku(prompt)
+    return _call_haiku(prompt, max_tokens=max_tokens, timeout=timeout)
@@ -4,13 +4,15 @@ import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 
+from . import caching, warmup
 from .config import config
-from .memory import _ensure_dirs
+from .memory import _ensure_dirs, writer
 from .routes import router
 
 logging.basicConfig(
@@ -24,10 +26,14 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting Charles API...")
     _ensure_dirs()
+    writer.start()
     logger.info(f"Data dir: {config.data_dir}")
+    await run_in_threadpool(warmup.run)
     logger.info("Charles API ready")
     yield
     logger.info("Charles API shutting down")
+    warmup.mark_not_ready()
+    writer.stop()
 
 
 app = FastAPI(
@@ -45,19 +51,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large bodies (memory pages); brotli when brotli-asgi is installed
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1024, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(router)
 
 # Static files + landing page
 static_dir = Path(__file__).parent / "static"
 if static_dir.exists():
-    app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+    app.mount("/static", caching.CachedStaticFiles(directory=str(static_dir)), name="static")
 
 
 @app.get("/", include_in_schema=False)
-async def landing_page():
+async def landing_page(request: Request):
     index_path = static_dir / "index.html"
     if index_path.exists():
-        return FileResponse(str(index_path))
+        st = index_path.stat()
+        tag = caching.etag(f"{st.st_mtime_ns:x}", f"{st.st_size:x}")
+        headers = caching.validator_headers(tag, st.st_mtime)
+        if caching.not_modified(request, tag, st.st_mtime):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(str(index_path), headers=headers)
     return {"message": "Charles API", "docs": "/docs"}
 
 
@@ -1,21 +1,73 @@
-"""Memory management for Charles."""
+"""Memory management for Charles.
 
+Memories are partitioned by source and month:
+
+    <data_dir>/memories/<source>/<YYYY-MM>.json
+    <data_dir>/memories/partitions.json   # manifest: count + latest time per partition
+
+Reads, counts, forgets and retention consult the manifest first and only
+open the partitions they need. The pre-partitioning ``memories.json`` is
+migrated into partitions on first use.
+"""
+
+import hashlib
 import json
 import logging
 import os
+import re
 import tempfile
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 
 from .config import config
+from .records import MEMORY_SCHEMA, RESPONSE_SCHEMA, RecordTable
+from .writer import GroupWriter
 
 logger = logging.getLogger(__name__)
 
+# Parsed stores, keyed by path: path -> (file signature, RecordTable).
+# Both gunicorn workers write the same files, so a cached table is only
+# reused while the file's (mtime, size) hasn't changed under us.
+_tables: dict = {}
+
 
 def _memories_path() -> str:
+    """Legacy single-file store, migrated into partitions on first use."""
     return os.path.join(config.data_dir, "memories.json")
 
 
+def _partitions_dir() -> str:
+    return os.path.join(config.data_dir, "memories")
+
+
+def _partitions_path() -> str:
+    return os.path.join(_partitions_dir(), "partitions.json")
+
+
+def _source_dir(source: Optional[str]) -> str:
+    """Directory name for a source; sanitized names get a hash so they can't collide.
+
+    No source and an empty one (stored without a ``source`` key) share ``_``.
+    """
+    if not source:
+        return "_"
+    slug = re.sub(r"[^A-Za-z0-9_.-]", "_", source)
+    if slug != source or slug in ("_", ".", ".."):
+        slug += "-" + hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    return slug
+
+
+def _month(timestamp) -> str:
+    try:
+        return datetime.fromisoformat(timestamp).strftime("%Y-%m")
+    except (TypeError, ValueError):
+        return "unknown"
+
+
+def _partition_path(source: Optional[str], month: str) -> str:
+    return os.path.join(_partitions_dir(), _source_dir(source), f"{month}.json")
+
+
 def _responses_path() -> str:
     return os.path.join(config.data_dir, "charles-dana", "responses.json")
 
@@ -58,15 +110,19 @@ def _backup_corrupt(path: str):
         logger.error(f"Could not back up {path}: {e}")
 
 
-def _safe_write_json(path: str, data: list):
+def _safe_write_json(path: str, data: Union[list, dict]):
     """Atomic write: dump to temp file in same dir, then rename."""
     _ensure_dirs()
     dir_name = os.path.dirname(path)
+    os.makedirs(dir_name, exist_ok=True)
     try:
         fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".tmp")
         with os.fdopen(fd, "w") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
         os.replace(tmp_path, path)
+        _fsync_dir(dir_name)
     except Exception as e:
         logger.error(f"Failed to write {path}: {e}")
         # Clean up temp file if rename failed
@@ -77,46 +133,423 @@ def _safe_write_json(path: str, data: list):
         raise
 
 
-def load_memories() -> list:
-    return _safe_load_json(_memories_path())
+def _fsync_dir(dir_name: str):
+    """Make a rename in dir_name durable."""
+    fd = os.open(dir_name, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
-def save_memories(memories: list):
-    _safe_write_json(_memories_path(), memories)
+def _file_signature(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_table(path: str, schema: tuple) -> RecordTable:
+    """Return the cached table for path, re-parsing only if the file changed."""
+    sig = _file_signature(path)
+    cached = _tables.get(path)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+    table = RecordTable.from_dicts(schema, _safe_load_json(path))
+    # Signature from before the read: if the file changed meanwhile, the next
+    # call sees a mismatch and reloads rather than trusting stale content.
+    _tables[path] = (sig, table)
+    return table
+
+
+def _write_table(path: str, table: RecordTable):
+    """Persist table to path and make it the cached copy.
+
+    An emptied partition is removed rather than written.
+    """
+    if not len(table) and path.startswith(_partitions_dir() + os.sep):
+        _tables.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    try:
+        _safe_write_json(path, table.to_dicts())
+    except Exception:
+        _tables.pop(path, None)
+        raise
+    _tables[path] = (_file_signature(path), table)
+
+
+# --- Partition manifest ---
+
+# path -> (file signature, {relative partition path: entry})
+_manifest_cache: dict = {}
+
+
+def _partition_entry(table: RecordTable) -> dict:
+    """Manifest entry for a non-empty partition.
 
+    ``last`` is the latest first-seen or last-seen time in the partition:
+    a partition whose ``last`` is older than what a query already has can
+    be skipped without opening it.
+    """
+    times = [t for t in (table.max_epoch("timestamp"), table.max_epoch("last_seen")) if t is not None]
+    return {
+        "source": table.get(0, "source"),
+        "month": _month(table.get(0, "timestamp")),
+        "count": len(table),
+        "last": max(times, default=0),
+    }
 
-def add_memory(text: str, source: Optional[str] = None) -> dict:
-    memories = load_memories()
-    entry = {"text": text, "timestamp": datetime.now().isoformat()}
+
+def _read_partitions() -> dict:
+    """Read the manifest from disk, rebuilding it from the partition files if it's unusable."""
+    path = _partitions_path()
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("partitions"), dict):
+                return data["partitions"]
+            logger.warning(f"Unexpected manifest format in {path} — rebuilding")
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read {path}: {e} — rebuilding")
+    elif not os.path.isdir(_partitions_dir()):
+        return {}
+
+    partitions = {}
+    for source_dir in sorted(os.listdir(_partitions_dir())):
+        full_dir = os.path.join(_partitions_dir(), source_dir)
+        if not os.path.isdir(full_dir):
+            continue
+        for name in sorted(os.listdir(full_dir)):
+            if name.endswith(".json"):
+                table = _load_table(os.path.join(full_dir, name), MEMORY_SCHEMA)
+                if len(table):
+                    partitions[f"{source_dir}/{name}"] = _partition_entry(table)
+    return partitions
+
+
+def _write_partitions(partitions: dict):
+    path = _partitions_path()
+    _safe_write_json(path, {"partitions": partitions})
+    _manifest_cache[path] = (_file_signature(path), partitions)
+
+
+def _partitions() -> dict:
+    """The manifest, re-read only when the file changed. Migrates the legacy store first."""
+    if os.path.exists(_memories_path()):
+        migrate_legacy()
+    path = _partitions_path()
+    sig = _file_signature(path)
+    cached = _manifest_cache.get(path)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+    partitions = _read_partitions()
+    _manifest_cache[path] = (sig, partitions)
+    return partitions
+
+
+def _expired(month: str) -> bool:
+    """True if month is older than the retention window (never for "unknown")."""
+    if config.retention_months <= 0 or month == "unknown":
+        return False
+    now = datetime.now()
+    index = now.year * 12 + now.month - 1 - config.retention_months
+    return month < f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _drop_expired(partitions: dict) -> int:
+    """Delete partitions past retention from disk and from partitions. Returns how many."""
+    dropped = 0
+    for rel, entry in list(partitions.items()):
+        if _expired(entry.get("month", "unknown")):
+            path = os.path.join(_partitions_dir(), rel)
+            _tables.pop(path, None)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del partitions[rel]
+            dropped += 1
+    if dropped:
+        logger.info(f"Retention: dropped {dropped} partition(s) older than {config.retention_months} months")
+    return dropped
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(path, _partitions_dir()).replace(os.sep, "/")
+
+
+def _on_commit(written: dict):
+    """Writer hook (under the write lock): refresh manifest entries for written partitions."""
+    prefix = _partitions_dir() + os.sep
+    changed = {path: table for path, table in written.items() if path.startswith(prefix)}
+    if not changed:
+        return
+    partitions = _read_partitions()
+    for path, table in changed.items():
+        if len(table):
+            partitions[_rel(path)] = _partition_entry(table)
+        else:
+            partitions.pop(_rel(path), None)
+    _drop_expired(partitions)
+    _write_partitions(partitions)
+
+
+# All store writes go through one group-committing writer per process
+writer = GroupWriter(_load_table, _write_table, on_commit=_on_commit)
+
+
+def migrate_legacy() -> int:
+    """Split the single-file memories.json into partitions. Returns records migrated.
+
+    Safe to call from both workers: the loser of the race finds the legacy
+    file already gone. The old file is kept as memories.json.migrated.
+    """
+    legacy = _memories_path()
+    if not os.path.exists(legacy):
+        return 0
+    with writer.lock():
+        if not os.path.exists(legacy):
+            return 0
+        records = [r for r in _safe_load_json(legacy) if isinstance(r, dict)]
+        groups: dict = {}
+        for record in records:
+            source = record.get("source") if isinstance(record.get("source"), str) else None
+            path = _partition_path(source, _month(record.get("timestamp")))
+            groups.setdefault(path, []).append(record)
+
+        partitions = _read_partitions()
+        for path, group in groups.items():
+            # Rows written to a partition before the migration ran stay after the legacy ones
+            existing = _load_table(path, MEMORY_SCHEMA).to_dicts()
+            table = RecordTable.from_dicts(MEMORY_SCHEMA, group + existing)
+            _write_table(path, table)
+            partitions[_rel(path)] = _partition_entry(table)
+        _write_partitions(partitions)
+        if os.path.exists(legacy):
+            os.replace(legacy, legacy + ".migrated")
+    logger.info(f"Migrated {len(records)} memories into {len(groups)} partition(s)")
+    return len(records)
+
+
+def apply_retention() -> int:
+    """Drop partitions older than RETENTION_MONTHS. Returns how many were dropped."""
+    if config.retention_months <= 0:
+        return 0
+    _partitions()
+    with writer.lock():
+        partitions = _read_partitions()
+        dropped = _drop_expired(partitions)
+        if dropped:
+            _write_partitions(partitions)
+    return dropped
+
+
+def _select(source: Optional[str] = None) -> list:
+    """(path, entry) for every partition, or only those of source if given."""
+    return [
+        (os.path.join(_partitions_dir(), rel), entry)
+        for rel, entry in _partitions().items()
+        if source is None or entry.get("source") == source
+    ]
+
+
+def _row_time(table: RecordTable, i: int) -> float:
+    return table.epoch(i, "timestamp") or 0
+
+
+def _recent_rows(n: int, source: Optional[str] = None) -> list:
+    """The n most recent (time, table, index) rows, newest first.
+
+    Partitions are visited latest-first and the scan stops as soon as the
+    next partition can't hold anything newer than what's already collected.
+    """
+    rows: list = []
+    if n <= 0:
+        return rows
+    selected = sorted(_select(source), key=lambda p: p[1].get("last", 0), reverse=True)
+    for path, entry in selected:
+        if len(rows) >= n and entry.get("last", 0) < rows[n - 1][0]:
+            break
+        table = _load_table(path, MEMORY_SCHEMA)
+        for i in table.latest(n, "timestamp"):
+            rows.append((_row_time(table, i), table, i))
+        rows.sort(key=lambda r: r[0], reverse=True)
+        del rows[n:]
+    return rows
+
+
+def _version(path: str) -> tuple:
+    """(change token, mtime) for a store file, from a stat call alone."""
+    sig = _file_signature(path)
+    if sig is None:
+        return "0", None
+    return f"{sig[0]:x}.{sig[1]:x}", sig[0] / 1e9
+
+
+def memories_version() -> tuple:
+    return _version(_partitions_path())
+
+
+def responses_version() -> tuple:
+    return _version(_responses_path())
+
+
+def _response_table() -> RecordTable:
+    return _load_table(_responses_path(), RESPONSE_SCHEMA)
+
+
+def load_memories() -> list:
+    """All memories across partitions, oldest first."""
+    rows = []
+    for path, _ in _select():
+        table = _load_table(path, MEMORY_SCHEMA)
+        rows.extend((_row_time(table, i), table, i) for i in range(len(table)))
+    rows.sort(key=lambda r: r[0])
+    return [table[i] for _, table, i in rows]
+
+
+def save_memories(memories: list):
+    """Replace the whole store with memories."""
+    groups: dict = {path: [] for path, _ in _select()}
+    for record in memories:
+        source = record.get("source") if isinstance(record.get("source"), str) else None
+        groups.setdefault(_partition_path(source, _month(record.get("timestamp"))), []).append(record)
+    writer.commit_many([
+        (path, MEMORY_SCHEMA, lambda _, group=group: (None, RecordTable.from_dicts(MEMORY_SCHEMA, group)))
+        for path, group in groups.items()
+    ])
+
+
+def _memory_entry(text: str, source: Optional[str], timestamp: Optional[str]) -> dict:
+    entry = {"text": text, "timestamp": timestamp or datetime.now().isoformat()}
     if source:
         entry["source"] = source
-    memories.append(entry)
-    save_memories(memories)
     return entry
 
 
-def forget(query: str) -> int:
-    memories = load_memories()
+_NUMBERS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def dedupe_key(text: str) -> str:
+    """Normalize text so retries and alert repeats compare equal.
+
+    Case and whitespace are ignored; numbers (counters, ids, times) too when
+    ``config.dedupe_ignore_numbers`` is set.
+    """
+    text = text.lower()
+    if config.dedupe_ignore_numbers:
+        text = _NUMBERS.sub("#", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def _fold_target(table: RecordTable, entry: dict) -> Optional[int]:
+    """Index of a recent record entry duplicates, or None."""
+    window = config.dedupe_window_seconds
+    if window <= 0 or not len(table):
+        return None
+    ts = datetime.fromisoformat(entry["timestamp"]).timestamp()
+    key = dedupe_key(entry["text"])
+    source = entry.get("source")
+    for i in range(len(table) - 1, max(len(table) - config.dedupe_lookback, 0) - 1, -1):
+        if table.get(i, "source") != source:
+            continue
+        last = table.epoch(i, "last_seen") or table.epoch(i, "timestamp")
+        if last is None or abs(ts - last) > window:
+            continue
+        text = table.get(i, "text")
+        if isinstance(text, str) and dedupe_key(text) == key:
+            return i
+    return None
+
+
+def _append_or_fold(table: RecordTable, entry: dict) -> dict:
+    """Append entry, or fold it into a recent duplicate by bumping its counter.
+
+    A folded record keeps its original text and ``timestamp`` (first seen)
+    and gains ``count`` and ``last_seen``.
+    """
+    i = _fold_target(table, entry)
+    if i is None:
+        table.append(entry)
+        return entry
+    last_seen = max(table.get(i, "last_seen") or table.get(i, "timestamp"), entry["timestamp"])
+    table.update(i, count=table.get(i, "count", 1) + 1, last_seen=last_seen)
+    return table[i]
+
+
+def add_memory(text: str, source: Optional[str] = None, timestamp: Optional[str] = None) -> dict:
+    """Remember text; returns once the write is on disk."""
+    entry = _memory_entry(text, source, timestamp)
+    return writer.commit(
+        _partition_path(entry.get("source"), _month(entry["timestamp"])),
+        MEMORY_SCHEMA,
+        lambda table: (_append_or_fold(table, entry), table),
+    )
+
+
+def add_memories(items: list) -> list:
+    """Append several (text, source, timestamp) memories in one commit."""
+    entries = [_memory_entry(text, source, timestamp) for text, source, timestamp in items]
+    groups: dict = {}
+    for entry in entries:
+        path = _partition_path(entry.get("source"), _month(entry["timestamp"]))
+        groups.setdefault(path, []).append(entry)
+    results = writer.commit_many([
+        (path, MEMORY_SCHEMA,
+         lambda table, group=group: ([_append_or_fold(table, entry) for entry in group], table))
+        for path, group in groups.items()
+    ])
+    return [entry for stored in results for entry in stored]
+
+
+def forget(query: str, source: Optional[str] = None) -> int:
+    """Remove memories containing query, in every partition or only source's."""
     q = query.lower()
-    remaining = [m for m in memories if q not in m.get("text", "").lower()]
-    forgotten = len(memories) - len(remaining)
-    if forgotten > 0:
-        save_memories(remaining)
-    return forgotten
+
+    def op(table: RecordTable):
+        remaining = table.filtered(lambda i: q not in (table.get(i, "text") or "").lower())
+        forgotten = len(table) - len(remaining)
+        return forgotten, remaining if forgotten else None
+
+    return sum(writer.commit_many([(path, MEMORY_SCHEMA, op) for path, _ in _select(source)]))
+
+
+def memory_page(offset: int = 0, limit: int = 50, source: Optional[str] = None) -> list:
+    """Memories most recent first, materializing only the requested page."""
+    offset, limit = max(offset, 0), max(limit, 0)
+    rows = _recent_rows(offset + limit, source)[offset:]
+    return [table[i] for _, table, i in rows]
+
+
+def preload() -> int:
+    """Load the partitions recent reads hit (prompt context, first /memories page)."""
+    memory_page(0, 50)
+    return memory_count()
 
 
 def load_responses() -> list:
-    return _safe_load_json(_responses_path())
+    return _response_table().to_dicts()
 
 
 def save_response(response: str, message_summary: str):
-    responses = load_responses()
-    responses.append({
+    entry = {
         "response": response,
         "message_summary": message_summary,
         "timestamp": datetime.now().isoformat(),
-    })
-    _safe_write_json(_responses_path(), responses)
+    }
+
+    def op(table: RecordTable):
+        table.append(entry)
+        return None, table
+
+    writer.commit(_responses_path(), RESPONSE_SCHEMA, op)
 
 
 def load_manifest() -> str:
@@ -127,17 +560,18 @@ def load_manifest() -> str:
     return "No rules defined yet."
 
 
-def get_recent_memories(n: int = 20) -> list:
-    return load_memories()[-n:]
+def get_recent_memories(n: int = 20, source: Optional[str] = None) -> list:
+    """The n most recent memories, oldest first."""
+    return [table[i] for _, table, i in reversed(_recent_rows(n, source))]
 
 
 def get_recent_responses(n: int = 10) -> list:
-    return load_responses()[-n:]
+    return _response_table().tail(n)
 
 
-def memory_count() -> int:
-    return len(load_memories())
+def memory_count(source: Optional[str] = None) -> int:
+    return sum(entry.get("count", 0) for _, entry in _select(source))
 
 
 def response_count() -> int:
-    return len(load_responses())
+    return len(_response_table())
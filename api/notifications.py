@@ -10,6 +10,9 @@ from .config import config
 
 logger = logging.getLogger(__name__)
 
+# Pooled keep-alive connections to the Telegram Bot API
+_session = requests.Session()
+
 # Daily notification counter (resets at midnight via date check)
 _notification_state = {
     "date": None,
@@ -42,7 +45,7 @@ def _telegram_api(method: str, **kwargs) -> dict:
         raise RuntimeError("TELEGRAM_BOT_TOKEN not set")
 
     url = f"https://api.telegram.org/bot{config.telegram_bot_token}/{method}"
-    response = requests.post(url, json=kwargs, timeout=10)
+    response = _session.post(url, json=kwargs, timeout=10)
 
     if response.status_code != 200:
         logger.error(f"Telegram API error: {response.status_code} — {response.text}")
@@ -51,6 +54,12 @@ def _telegram_api(method: str, **kwargs) -> dict:
     return response.json()
 
 
+def warm_connection():
+    """Open (and pool) a connection to the Bot API ahead of the first message."""
+    if config.telegram_bot_token:
+        _telegram_api("getMe")
+
+
 def send_notification(summary: str, message_text: str) -> dict:
     """Send a Telegram notification with Yes/No/Prompt buttons.
 
@@ -0,0 +1,272 @@
+"""Compact in-process representation of memory and response records.
+
+A ``RecordTable`` keeps records in columns instead of one dict per entry:
+
+- text fields are UTF-8 encoded into one contiguous ``bytearray`` per
+  field, addressed by an ``array('Q')`` of end offsets;
+- timestamp fields are epoch floats in an ``array('d')``;
+- low-cardinality fields (``source``) are interned into a small lookup
+  table and stored as ``array('H')`` ids.
+
+Rows are only turned back into the dict shape the API returns when they
+are read (``table[i]``, ``table.get(i, field)``, ``table.tail(n)``).
+Records that don't fit the schema losslessly (missing fields, timestamps
+with a UTC offset, ...) are kept verbatim in a side dict, so a load/save
+round trip never changes what is on disk.
+
+Footprint per million memories (CPython 3.11, 64-bit), measured with
+tracemalloc on 80-character ASCII texts from one source:
+
+    list of dicts (json.load)   ~460 MB   dict + text str + ISO str + source str
+    RecordTable                 ~104 MB   ~82 MB text + 8 MB offsets
+                                          + 8 MB timestamps + 2 MB source ids
+
+i.e. ~20 bytes of overhead per record plus the UTF-8 text, against ~330
+bytes plus a ``str`` header per record for the dict representation.
+"""
+
+import heapq
+import math
+import sys
+from array import array
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+TEXT = "text"
+TIME = "time"
+INTERN = "intern"
+
+MEMORY_SCHEMA = (("text", TEXT), ("timestamp", TIME), ("source", INTERN))
+RESPONSE_SCHEMA = (("response", TEXT), ("message_summary", TEXT), ("timestamp", TIME))
+
+
+def to_epoch(iso: str) -> Optional[float]:
+    """Parse a naive ISO timestamp to epoch seconds, or None if it can't round-trip."""
+    try:
+        dt = datetime.fromisoformat(iso)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        return None
+    ts = dt.timestamp()
+    if to_iso(ts) != iso:
+        return None
+    return ts
+
+
+def _any_epoch(value) -> Optional[float]:
+    """Epoch of any ISO timestamp (naive or aware), or None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def to_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts).isoformat()
+
+
+class _TextColumn:
+    __slots__ = ("buf", "ends")
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.ends = array("Q")
+
+    def append(self, value: str):
+        self.buf += value.encode("utf-8")
+        self.ends.append(len(self.buf))
+
+    def get(self, i: int) -> str:
+        start = self.ends[i - 1] if i else 0
+        return self.buf[start:self.ends[i]].decode("utf-8")
+
+
+class RecordTable:
+    """Append-only columnar table of records sharing one schema."""
+
+    __slots__ = ("schema", "_text", "_time", "_intern", "_values", "_ids", "_raw", "_extra", "_len")
+
+    def __init__(self, schema: tuple):
+        self.schema = schema
+        self._text = {name: _TextColumn() for name, kind in schema if kind == TEXT}
+        self._time = {name: array("d") for name, kind in schema if kind == TIME}
+        self._intern = {name: array("H") for name, kind in schema if kind == INTERN}
+        # Interned values; id 0 means "field absent"
+        self._values: list = [None]
+        self._ids: dict = {}
+        # Row index -> original dict, for records that don't fit the schema
+        self._raw: dict = {}
+        # Row index -> extra keys not covered by the schema
+        self._extra: dict = {}
+        self._len = 0
+
+    @classmethod
+    def from_dicts(cls, schema: tuple, records: Iterable[dict]) -> "RecordTable":
+        table = cls(schema)
+        for record in records:
+            table.append(record)
+        return table
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _intern_id(self, value: str) -> int:
+        vid = self._ids.get(value)
+        if vid is None:
+            vid = len(self._values)
+            self._values.append(sys.intern(value))
+            self._ids[value] = vid
+        return vid
+
+    def _fits(self, record: dict) -> bool:
+        if not isinstance(record, dict):
+            return False
+        for name, kind in self.schema:
+            value = record.get(name)
+            if kind == INTERN:
+                if value is not None and not isinstance(value, str):
+                    return False
+                if value is not None and len(self._values) >= 0xFFFF and value not in self._ids:
+                    return False
+            elif not isinstance(value, str):
+                return False
+        return True
+
+    def append(self, record: dict):
+        i = self._len
+        epochs = {}
+        fits = self._fits(record)
+        if fits:
+            for name in self._time:
+                epochs[name] = to_epoch(record[name])
+                if epochs[name] is None:
+                    fits = False
+                    break
+
+        for name, kind in self.schema:
+            if kind == TEXT:
+                self._text[name].append(record[name] if fits else "")
+            elif kind == TIME:
+                # -inf for rows kept verbatim, so max() over the column still works
+                self._time[name].append(epochs[name] if fits else -math.inf)
+            else:
+                value = record.get(name) if fits else None
+                self._intern[name].append(0 if value is None else self._intern_id(value))
+
+        if not fits:
+            self._raw[i] = dict(record) if isinstance(record, dict) else record
+        else:
+            extra = {k: v for k, v in record.items() if k not in self._text
+                     and k not in self._time and k not in self._intern}
+            if extra:
+                self._extra[i] = extra
+        self._len += 1
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("record index out of range")
+        return i
+
+    def __getitem__(self, i: int) -> dict:
+        i = self._index(i)
+        raw = self._raw.get(i)
+        if raw is not None:
+            return dict(raw) if isinstance(raw, dict) else raw
+        record = {}
+        for name, kind in self.schema:
+            if kind == TEXT:
+                record[name] = self._text[name].get(i)
+            elif kind == TIME:
+                record[name] = to_iso(self._time[name][i])
+            else:
+                vid = self._intern[name][i]
+                if vid:
+                    record[name] = self._values[vid]
+        extra = self._extra.get(i)
+        if extra:
+            record.update(extra)
+        return record
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(self._len):
+            yield self[i]
+
+    def get(self, i: int, field: str, default=None):
+        """Read one field without materializing the whole record."""
+        i = self._index(i)
+        raw = self._raw.get(i)
+        if raw is not None:
+            return raw.get(field, default) if isinstance(raw, dict) else default
+        if field in self._text:
+            return self._text[field].get(i)
+        if field in self._time:
+            return to_iso(self._time[field][i])
+        if field in self._intern:
+            vid = self._intern[field][i]
+            return self._values[vid] if vid else default
+        return self._extra.get(i, {}).get(field, default)
+
+    def epoch(self, i: int, field: str) -> Optional[float]:
+        """Epoch seconds of a timestamp field, or None if unavailable."""
+        i = self._index(i)
+        if field in self._time and i not in self._raw:
+            return self._time[field][i]
+        return _any_epoch(self.get(i, field))
+
+    def max_epoch(self, field: str) -> Optional[float]:
+        """Latest epoch of a timestamp field over all rows, or None if there is none."""
+        if field in self._time:
+            latest = max(self._time[field], default=-math.inf)
+            rows = list(self._raw.values())
+        else:
+            latest = -math.inf
+            rows = list(self._extra.values()) + list(self._raw.values())
+        for row in rows:
+            value = row.get(field) if isinstance(row, dict) else None
+            ts = _any_epoch(value)
+            if ts is not None and ts > latest:
+                latest = ts
+        return None if latest == -math.inf else latest
+
+    def latest(self, n: int, field: str) -> list:
+        """Indices of the n rows with the latest timestamp field, newest first.
+
+        Ordered by the timestamp, not by position: a row appended late with an
+        old timestamp ranks by its timestamp. Ties go to the later row.
+        """
+        if field in self._time and not self._raw:
+            key = self._time[field].__getitem__
+        else:
+            def key(i):
+                ts = self.epoch(i, field)
+                return -math.inf if ts is None else ts
+        return heapq.nlargest(n, range(self._len - 1, -1, -1), key=key)
+
+    def update(self, i: int, **fields):
+        """Set keys outside the schema (e.g. counters) on an existing row."""
+        i = self._index(i)
+        raw = self._raw.get(i)
+        if isinstance(raw, dict):
+            raw.update(fields)
+        elif raw is None:
+            self._extra.setdefault(i, {}).update(fields)
+
+    def to_dicts(self) -> list:
+        return list(self)
+
+    def tail(self, n: int) -> list:
+        """Last n records, oldest first (same as ``list[-n:]``)."""
+        return [self[i] for i in range(self._len)[-n:]]
+
+    def filtered(self, keep) -> "RecordTable":
+        """New table with only the rows whose index satisfies keep(i)."""
+        table = RecordTable(self.schema)
+        for i in range(self._len):
+            if keep(i):
+                table.append(self[i])
+        return table
@@ -1,12 +1,16 @@
 """API routes for Charles."""
 
 import logging
-from typing import Optional
+from datetime import datetime
+from typing import Literal, Optional
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from . import memory, notifications
+from . import caching, memory, notifications, seen, warmup
+from .config import config
 from .haiku import classify_message, chat_response
 
 logger = logging.getLogger(__name__)
@@ -19,26 +23,59 @@ router = APIRouter()
 class MessageRequest(BaseModel):
     text: str
     source: Optional[str] = None
+    # store: remember only; classify: + notify decision; reply: + chat reply.
+    # Defaults to the per-source tier from config.
+    tier: Optional[Literal["store", "classify", "reply"]] = None
+
+class BatchMessage(BaseModel):
+    text: str
+    source: Optional[str] = None
+    id: Optional[str] = None
+    timestamp: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    messages: list[BatchMessage]
 
 class ForgetRequest(BaseModel):
     query: str
+    source: Optional[str] = None
 
 class MessageResponse(BaseModel):
     remembered: bool
+    tier: Optional[str] = None
     reply: Optional[str] = None
     notification_sent: bool = False
     classification: Optional[dict] = None
 
+class BatchResponse(BaseModel):
+    stored: int
+    duplicates: int
+
 class ForgetResponse(BaseModel):
     forgotten: int
     query: str
 
 
+MAX_BATCH = 500
+
+
 # --- Endpoints ---
 
 @router.get("/health")
-async def health():
-    return {
+async def health(request: Request):
+    memories_tag, memories_mtime = memory.memories_version()
+    responses_tag, responses_mtime = memory.responses_version()
+    hits = seen.hit_counts()
+    tag = caching.etag(
+        memories_tag,
+        responses_tag,
+        notifications.notifications_today(),
+        notifications.config.max_notifications_per_day,
+        sum(hits.values()),
+    )
+    last_modified = max(filter(None, (memories_mtime, responses_mtime)), default=None)
+
+    return caching.cached_json(request, tag, last_modified, lambda: {
         "status": "ok",
         "service": "charles",
         "memories": memory.memory_count(),
@@ -46,35 +83,47 @@ async def health():
         "notifications_today": notifications.notifications_today(),
         "max_notifications": notifications.config.max_notifications_per_day,
         "can_notify": notifications.can_notify(),
-    }
+        "dedupe_hits": hits,
+    })
+
+
+@router.get("/ready")
+async def ready():
+    """200 once this worker has warmed its caches and connections, else 503."""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
 @router.post("/message", response_model=MessageResponse)
-async def receive_message(req: MessageRequest):
+def receive_message(req: MessageRequest):
     """Receive a message, remember it, classify it, maybe notify."""
     text = req.text.strip()
     if not text:
         raise HTTPException(status_code=400, detail="Empty message")
 
     source = req.source
+    tier = req.tier or config.source_tiers.get(source or "", config.default_tier)
 
     # 1. Remember (with source tag)
     memory.add_memory(text, source=source)
 
-    # Self-sent prompts from Claude Code: remember silently, no classification
-    if source == "claude-code":
+    # Store-only traffic (e.g. self-sent Claude Code prompts): no Bedrock calls
+    if tier == "store":
         return MessageResponse(
             remembered=True,
+            tier=tier,
             reply=None,
             notification_sent=False,
-            classification={"notify": False, "reason": "self-sent (claude-code)", "summary": ""},
+            classification={"notify": False, "reason": f"store-only ({source or 'no source'})", "summary": ""},
         )
 
     # 2. Classify with Haiku
     notification_sent = False
     classification = None
     try:
-        classification = classify_message(text)
+        classification = classify_message(
+            text, max_tokens=config.classify_max_tokens, timeout=config.classify_timeout
+        )
 
         # 3. Maybe notify
         if classification.get("notify") and notifications.can_notify():
@@ -88,52 +137,117 @@ async def receive_message(req: MessageRequest):
         logger.error(f"Classification/notification error: {e}")
         classification = {"notify": False, "reason": f"Error: {e}", "summary": ""}
 
-    # 4. Generate chat reply
+    # 4. Generate chat reply (reply tier only)
     reply = None
-    try:
-        reply = chat_response(text)
-    except Exception as e:
-        logger.error(f"Chat response error: {e}")
+    if tier == "reply":
+        try:
+            reply = chat_response(text, max_tokens=config.reply_max_tokens, timeout=config.reply_timeout)
+        except Exception as e:
+            logger.error(f"Chat response error: {e}")
 
     return MessageResponse(
         remembered=True,
+        tier=tier,
         reply=reply,
         notification_sent=notification_sent,
         classification=classification,
     )
 
 
+def _valid_timestamp(ts: Optional[str]) -> Optional[str]:
+    if not ts:
+        return None
+    try:
+        datetime.fromisoformat(ts)
+    except ValueError:
+        return None
+    return ts
+
+
+@router.post("/messages/batch", response_model=BatchResponse)
+def receive_batch(req: BatchRequest):
+    """Store a batch of replayed messages (e.g. the CLI's offline spool).
+
+    Messages are remembered only — by the time they're replayed nobody is
+    waiting for a reply. Messages carrying an ``id`` are idempotent: a
+    replay of an already-stored id is counted as a duplicate and skipped.
+    Ids stay pending until the batch is on disk, so a worker dying mid-batch
+    doesn't turn the client's retry into a "duplicate".
+    """
+    if len(req.messages) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH})")
+
+    items = []
+    keys = []
+    duplicates = 0
+    for m in req.messages:
+        text = m.text.strip()
+        if not text:
+            continue
+        if m.id:
+            if not seen.mark("message", m.id, pending=True):
+                duplicates += 1
+                continue
+            keys.append(m.id)
+        items.append((text, m.source, _valid_timestamp(m.timestamp)))
+
+    try:
+        memory.add_memories(items)
+    except Exception:
+        for key in keys:
+            seen.unmark("message", key)
+        raise
+    seen.confirm("message", keys)
+
+    return BatchResponse(stored=len(items), duplicates=duplicates)
+
+
 @router.post("/forget", response_model=ForgetResponse)
-async def forget_memories(req: ForgetRequest):
+def forget_memories(req: ForgetRequest):
     """Forget memories matching query."""
     query = req.query.strip()
     if not query:
         raise HTTPException(status_code=400, detail="Empty query")
 
-    forgotten = memory.forget(query)
+    forgotten = memory.forget(query, source=req.source)
     return ForgetResponse(forgotten=forgotten, query=query)
 
 
 @router.get("/memories")
-async def get_memories(limit: int = 50, offset: int = 0):
-    """Return memories, most recent first."""
-    all_memories = memory.load_memories()
-    total = len(all_memories)
-    # Reverse for most recent first
-    reversed_memories = list(reversed(all_memories))
-    page = reversed_memories[offset:offset + limit]
-    return {
-        "total": total,
+async def get_memories(request: Request, limit: int = 50, offset: int = 0, source: Optional[str] = None):
+    """Return memories, most recent first, optionally from one source only."""
+    version, last_modified = memory.memories_version()
+    tag = caching.etag(version, offset, limit, source or "")
+    return caching.cached_json(request, tag, last_modified, lambda: {
+        "total": memory.memory_count(source),
         "offset": offset,
         "limit": limit,
-        "memories": page,
-    }
+        "memories": memory.memory_page(offset, limit, source),
+    })
 
 
 @router.post("/webhook/telegram")
 async def telegram_webhook(request: Request):
     """Handle Telegram bot callbacks (button presses and text replies)."""
     body = await request.json()
+
+    # Telegram redelivers updates it thinks timed out: ack repeats without
+    # running Haiku or storing anything a second time.
+    update_id = body.get("update_id")
+    if update_id is not None and not seen.mark("telegram", update_id):
+        logger.info(f"Telegram webhook: duplicate update {update_id}, skipped")
+        return {"ok": True}
+
+    try:
+        return await run_in_threadpool(_handle_telegram_update, body)
+    except Exception:
+        # Let Telegram's retry through, since this attempt didn't complete
+        if update_id is not None:
+            seen.unmark("telegram", update_id)
+        raise
+
+
+def _handle_telegram_update(body: dict) -> dict:
     logger.info(f"Telegram webhook: {body}")
 
     # Handle callback query (button press)
@@ -143,20 +257,30 @@ async def telegram_webhook(request: Request):
         message_id = cq.get("message", {}).get("message_id", 0)
         callback_query_id = cq.get("id", "")
 
-        result = notifications.handle_callback(callback_data, message_id)
-
-        # Store response
-        action = result["action"]
-        summary = result["summary"]
+        if callback_query_id and not seen.mark("telegram-callback", callback_query_id):
+            logger.info(f"Telegram webhook: duplicate callback {callback_query_id}, skipped")
+            return {"ok": True}
 
-        if action == "yes":
-            memory.save_response("Yes (acknowledged)", summary)
-            notifications.answer_callback_query(callback_query_id, "Acknowledged")
-        elif action == "no":
-            memory.save_response("No (dismissed)", summary)
-            notifications.answer_callback_query(callback_query_id, "Dismissed")
-        elif action == "prompt":
-            notifications.answer_callback_query(callback_query_id, "Type your response...")
+        try:
+            result = notifications.handle_callback(callback_data, message_id)
+
+            # Store response
+            action = result["action"]
+            summary = result["summary"]
+
+            if action == "yes":
+                memory.save_response("Yes (acknowledged)", summary)
+                notifications.answer_callback_query(callback_query_id, "Acknowledged")
+            elif action == "no":
+                memory.save_response("No (dismissed)", summary)
+                notifications.answer_callback_query(callback_query_id, "Dismissed")
+            elif action == "prompt":
+                notifications.answer_callback_query(callback_query_id, "Type your response...")
+        except Exception:
+            # Same as update_id: a failed attempt mustn't swallow the retry
+            if callback_query_id:
+                seen.unmark("telegram-callback", callback_query_id)
+            raise
 
         return {"ok": True}
 
@@ -185,7 +309,9 @@ async def telegram_webhook(request: Request):
 
             # Generate reply via Haiku and remember the exchange
             try:
-                reply = chat_response(text)
+                reply = chat_response(
+                    text, max_tokens=config.reply_max_tokens, timeout=config.reply_timeout
+                )
                 if reply:
                     notifications.send_message(reply)
                     memory.add_memory(f"[charles replied] {reply}", source="telegram")
@@ -0,0 +1,160 @@
+"""Bounded record of already-processed keys, shared by all workers.
+
+Backed by a small SQLite file next to the JSON stores so both gunicorn
+workers see the same keys. Each namespace keeps at most
+``config.seen_max_keys`` entries; the oldest are pruned as new ones come in.
+Duplicate hits are counted per namespace in the same file.
+
+A key can be marked *pending* while the work it guards isn't durable yet.
+If the process dies before confirming it, the next worker to start releases
+it, so a retry is processed instead of being taken for a duplicate.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+_PRUNE_EVERY = 100
+
+_local = threading.local()
+_inserts = 0
+
+
+def _seen_path() -> str:
+    return os.path.join(config.data_dir, "seen.sqlite3")
+
+
+def _db() -> sqlite3.Connection:
+    path = _seen_path()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path:
+        return conn
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS seen ("
+        " ns TEXT NOT NULL, key TEXT NOT NULL, ts REAL NOT NULL,"
+        " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS seen_ns_ts ON seen (ns, ts)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS hits (ns TEXT PRIMARY KEY, n INTEGER NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pending ("
+        " ns TEXT NOT NULL, key TEXT NOT NULL, pid INTEGER NOT NULL,"
+        " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+    )
+    _local.conn = conn
+    _local.path = path
+    return conn
+
+
+def _prune(conn: sqlite3.Connection, ns: str):
+    conn.execute(
+        "DELETE FROM seen WHERE ns = ? AND ts <= ("
+        " SELECT ts FROM seen WHERE ns = ? ORDER BY ts DESC LIMIT 1 OFFSET ?)",
+        (ns, ns, config.seen_max_keys),
+    )
+
+
+def mark(ns: str, key: str, pending: bool = False) -> bool:
+    """Record key as seen. Returns True the first time, False for a duplicate.
+
+    With pending=True the mark only outlives this process once confirm()ed.
+    """
+    global _inserts
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO seen (ns, key, ts) VALUES (?, ?, ?)",
+            (ns, str(key), time.time()),
+        )
+        if cur.rowcount == 1 and pending:
+            conn.execute(
+                "INSERT OR REPLACE INTO pending (ns, key, pid) VALUES (?, ?, ?)",
+                (ns, str(key), os.getpid()),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if cur.rowcount != 1:
+        conn.execute(
+            "INSERT INTO hits (ns, n) VALUES (?, 1) ON CONFLICT (ns) DO UPDATE SET n = n + 1",
+            (ns,),
+        )
+        return False
+    _inserts += 1
+    if _inserts % _PRUNE_EVERY == 0:
+        try:
+            _prune(conn, ns)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not prune seen keys for {ns}: {e}")
+    return True
+
+
+def unmark(ns: str, key: str):
+    """Forget a key, e.g. when processing failed and a retry should go through."""
+    conn = _db()
+    conn.execute("DELETE FROM seen WHERE ns = ? AND key = ?", (ns, str(key)))
+    conn.execute("DELETE FROM pending WHERE ns = ? AND key = ?", (ns, str(key)))
+
+
+def confirm(ns: str, keys: list):
+    """Make pending marks permanent once the work they guard is durable."""
+    _db().executemany("DELETE FROM pending WHERE ns = ? AND key = ?", [(ns, str(k)) for k in keys])
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def release_orphans() -> int:
+    """Unmark pending keys of processes that died before confirming them.
+
+    Run at startup: a worker killed between marking a key and storing what
+    it guards (OOM, gunicorn timeout) would otherwise turn the client's
+    retry into a "duplicate". Returns how many keys were released.
+    """
+    conn = _db()
+    released = 0
+    for (pid,) in conn.execute("SELECT DISTINCT pid FROM pending").fetchall():
+        if _alive(pid):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                "DELETE FROM seen WHERE EXISTS (SELECT 1 FROM pending p"
+                " WHERE p.pid = ? AND p.ns = seen.ns AND p.key = seen.key)",
+                (pid,),
+            )
+            conn.execute("DELETE FROM pending WHERE pid = ?", (pid,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        released += cur.rowcount
+    if released:
+        logger.warning(f"Released {released} seen keys left pending by dead workers")
+    return released
+
+
+def hit_counts() -> dict:
+    """Duplicate hits per namespace since the store was created, across workers."""
+    return dict(_db().execute("SELECT ns, n FROM hits").fetchall())
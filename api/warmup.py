@@ -0,0 +1,50 @@
+"""Startup warmup: fill caches and open upstream connections before serving.
+
+Runs from the lifespan hook, so a worker only starts accepting requests
+once it's warm; ``/ready`` reports the outcome for the deploy script.
+"""
+
+import logging
+import time
+
+from . import haiku, memory, notifications, seen
+
+logger = logging.getLogger(__name__)
+
+_state = {"ready": False, "warmup_ms": None, "steps": {}}
+
+STEPS = (
+    ("migrate", memory.migrate_legacy),
+    ("retention", memory.apply_retention),
+    ("memories", memory.preload),
+    ("responses", memory.response_count),
+    ("manifest", memory.load_manifest),
+    ("seen", seen.release_orphans),
+    ("bedrock", haiku.warm_connection),
+    ("telegram", notifications.warm_connection),
+)
+
+
+def run():
+    """Run every warmup step. A failing step is logged, never fatal."""
+    start = time.time()
+    for name, step in STEPS:
+        step_start = time.time()
+        try:
+            step()
+            result = "ok"
+        except Exception as e:
+            logger.warning(f"Warmup step {name} failed: {e}")
+            result = f"error: {e}"
+        _state["steps"][name] = {"result": result, "ms": int((time.time() - step_start) * 1000)}
+    _state["warmup_ms"] = int((time.time() - start) * 1000)
+    _state["ready"] = True
+    logger.info(f"Warmup done in {_state['warmup_ms']}ms")
+
+
+def mark_not_ready():
+    _state["ready"] = False
+
+
+def status() -> dict:
+    return {"ready": _state["ready"], "warmup_ms": _state["warmup_ms"], "steps": dict(_state["steps"])}
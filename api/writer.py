@@ -0,0 +1,172 @@
+"""Single-writer queue with group commit for the JSON stores.
+
+Request handlers don't write files themselves: they submit an operation
+and wait for it. One writer thread per process drains the queue, applies
+every queued operation for a file to its table, then writes and fsyncs
+that file once for the whole group. Callers are released only after the
+fsync, so a returned ``add_memory`` is durable.
+
+The two gunicorn workers each run a writer. They serialize on an
+``flock`` over ``<data_dir>/.write.lock``, and each group re-reads a file
+if the other worker changed it since it was last loaded.
+"""
+
+import fcntl
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# op(table) -> (result, changed table or None). Appends mutate and return
+# the same table, rewrites (forget, save_memories) return a new one, and
+# None means the op left the store as it was.
+Op = Callable
+
+
+class GroupWriter:
+    """Group-commits store operations from a queue on a background thread."""
+
+    def __init__(self, load: Callable, write: Callable, on_commit: Optional[Callable] = None):
+        self._load = load
+        self._write = write
+        # Called once per group, still under the lock, with {path: table}
+        # for every file the group wrote
+        self._on_commit = on_commit
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.ops = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="charles-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Flush everything queued so far, then stop the thread."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+        self._thread = None
+
+    def commit(self, path: str, schema: tuple, op: Op):
+        """Queue op against the store at path and block until it's durable."""
+        return self.commit_many([(path, schema, op)])[0]
+
+    def commit_many(self, items: list) -> list:
+        """Queue several (path, schema, op) at once; they land in the same group
+        unless it's full. Blocks until all are durable, returns their results."""
+        self.start()
+        futures = []
+        for path, schema, op in items:
+            future: Future = Future()
+            self._queue.put((path, schema, op, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    @contextmanager
+    def lock(self):
+        """Cross-process write lock. Not reentrant: never take it inside an op."""
+        os.makedirs(config.data_dir, exist_ok=True)
+        with open(os.path.join(config.data_dir, ".write.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _collect(self, first) -> tuple:
+        """Gather a group: first, plus whatever arrives within the latency bound."""
+        group = [first]
+        stop = False
+        deadline = time.monotonic() + config.write_max_delay_ms / 1000
+        while len(group) < config.write_batch_max:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            group.append(item)
+        return group, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group, stop = self._collect(first)
+            try:
+                self._commit_group(group)
+            except Exception as e:
+                logger.error(f"Group commit failed: {e}")
+                for *_, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+            if stop:
+                return
+
+    def _commit_group(self, group: list):
+        by_path: dict = {}
+        for path, schema, op, future in group:
+            by_path.setdefault(path, (schema, []))[1].append((op, future))
+
+        done = []
+        with self.lock():
+            written = {}
+            for path, (schema, ops) in by_path.items():
+                table, results = self._commit_file(path, schema, ops)
+                if table is not None:
+                    written[path] = table
+                done.extend(results)
+            if written and self._on_commit is not None:
+                self._on_commit(written)
+
+        # Release callers only once everything, including on_commit, is on disk
+        for future, result in done:
+            future.set_result(result)
+        self.batches += 1
+        self.ops += len(group)
+
+    def _commit_file(self, path: str, schema: tuple, ops: list) -> tuple:
+        """Apply ops to path's table and write it once.
+
+        Returns (table if written else None, [(future, result)] to resolve).
+        Futures of failed ops are failed here.
+        """
+        table = self._load(path, schema)
+        results = []
+        changed = False
+        for op, future in ops:
+            try:
+                result, new_table = op(table)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if new_table is not None:
+                table = new_table
+                changed = True
+            results.append((future, result))
+
+        if changed:
+            try:
+                self._write(path, table)
+            except Exception as e:
+                for future, _ in results:
+                    future.set_exception(e)
+                return None, []
+
+        return (table if changed else None), results
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
+# Spawned by the prompt hook on every submit, so keep startup cheap: stdlib
+# only, and anything beyond json/os/sys/time is imported where it's used.
 import json
 import os
 import sys
-from datetime import datetime
-
-import requests
+import time
 
 MEMORY_DIR = os.path.expanduser("~/.charles")
 MEMORY_FILE = os.path.join(MEMORY_DIR, "memories.json")
+SPOOL_FILE = os.path.join(MEMORY_DIR, "spool.jsonl")
+OFFLINE_FILE = os.path.join(MEMORY_DIR, "offline")
+RELAY_SOCKET = os.path.join(MEMORY_DIR, "relay.sock")
+
+# After a failed send, skip the network for this long and spool straight away
+OFFLINE_BACKOFF = 60
+SPOOL_BATCH = 100
+# Same text spooled again within this many seconds is a re-send (hook retry)
+RESEND_WINDOW = 5
+CONNECT_TIMEOUT = 2
 
 API_URL = os.environ.get("CHARLES_API_URL", "https://charles.aws.monce.ai")
 
@@ -16,6 +26,70 @@ MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
 BEDROCK_URL = f"https://bedrock-runtime.{BEDROCK_REGION}.amazonaws.com/model/{MODEL_ID}/invoke"
 
 
+def _now():
+    from datetime import datetime
+    return datetime.now().isoformat()
+
+
+def _connect(url):
+    """Open an HTTP(S) connection to url's host. Returns (conn, base path)."""
+    import http.client
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    conn = cls(parts.hostname, parts.port, timeout=CONNECT_TIMEOUT)
+    conn.connect()
+    return conn, parts.path.rstrip("/")
+
+
+def _send_json(conn, path, payload, headers=None, timeout=35):
+    """Write a JSON POST on an open connection without reading the reply."""
+    # After a "Connection: close" reply the sock is gone and request()
+    # reconnects on its own, using conn.timeout
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    all_headers = {"Content-Type": "application/json"}
+    all_headers.update(headers or {})
+    conn.request("POST", path, body=json.dumps(payload).encode("utf-8"), headers=all_headers)
+
+
+def _post_json(conn, path, payload, headers=None, timeout=35):
+    """POST JSON on an open connection and return the decoded reply."""
+    _send_json(conn, path, payload, headers, timeout)
+    response = conn.getresponse()
+    body = response.read()
+    if response.status >= 400:
+        raise RuntimeError(f"HTTP {response.status}: {body[:200].decode('utf-8', 'replace')}")
+    return json.loads(body)
+
+
+def api_post(path, payload, timeout=35):
+    """One-shot POST to Charles API on a fresh connection."""
+    conn, base = _connect(API_URL)
+    try:
+        return _post_json(conn, base + path, payload, timeout=timeout)
+    finally:
+        conn.close()
+
+
+def api_send(path, payload, timeout=None):
+    """Fire-and-forget POST: returns once the request is written.
+
+    The server handles the request whether or not anyone reads the reply,
+    so the caller doesn't wait out the classify call. Only connecting and
+    writing can fail here. timeout is accepted for api_post compatibility;
+    nothing waits long enough for it to matter.
+    """
+    conn, base = _connect(API_URL)
+    try:
+        _send_json(conn, base + path, payload, timeout=CONNECT_TIMEOUT)
+    finally:
+        conn.close()
+    return {"queued": False}
+
+
 def load_memories():
     if os.path.exists(MEMORY_FILE):
         with open(MEMORY_FILE) as f:
@@ -46,48 +120,206 @@ def ask_haiku(text):
 
     prompt = f"{context}User says: {text}"
 
-    response = requests.post(
-        BEDROCK_URL,
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1024,
-            "messages": [{"role": "user", "content": prompt}],
-        },
-        timeout=30,
-    )
-
-    if response.status_code != 200:
-        print(f"Bedrock error: {response.status_code} — {response.text}")
+    conn, path = _connect(BEDROCK_URL)
+    try:
+        result = _post_json(
+            conn,
+            path,
+            {
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 1024,
+                "messages": [{"role": "user", "content": prompt}],
+            },
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=30,
+        )
+    except RuntimeError as e:
+        print(f"Bedrock error: {e}")
         sys.exit(1)
+    finally:
+        conn.close()
 
-    result = response.json()
     return result.get("content", [{}])[0].get("text", "")
 
 
-def api_message(text):
+def api_message(payload, post=api_post):
     """Send message to Charles API."""
-    response = requests.post(
-        f"{API_URL}/message",
-        json={"text": text},
-        timeout=35,
+    return post("/message", payload, timeout=35)
+
+
+def api_batch(messages, post=api_post):
+    """Replay spooled messages to Charles API."""
+    return post("/messages/batch", {"messages": messages}, timeout=30)
+
+
+def is_offline():
+    """True while we're backing off after a failed send."""
+    try:
+        return os.path.getmtime(OFFLINE_FILE) > time.time()
+    except OSError:
+        return False
+
+
+def mark_offline():
+    os.makedirs(MEMORY_DIR, exist_ok=True)
+    with open(OFFLINE_FILE, "w"):
+        pass
+    until = time.time() + OFFLINE_BACKOFF
+    os.utime(OFFLINE_FILE, (until, until))
+
+
+def mark_online():
+    try:
+        os.unlink(OFFLINE_FILE)
+    except OSError:
+        pass
+
+
+def spool(text):
+    """Append a message to the offline spool. One small O_APPEND write, no reads."""
+    os.makedirs(MEMORY_DIR, exist_ok=True)
+    line = json.dumps({
+        "id": os.urandom(16).hex(),
+        "text": text,
+        "timestamp": _now(),
+    }, ensure_ascii=False)
+    with open(SPOOL_FILE, "a") as f:
+        f.write(line + "\n")
+
+
+def _read_spool(path):
+    messages = []
+    with open(path) as f:
+        for line in f:
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                continue
+    return messages
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # EPERM: it exists, it's just not ours
+        return True
+    return True
+
+
+def _claim_spools():
+    """Rename the spool, and any spool left claimed by a dead process, to
+    files owned by this process. Returns the claimed paths."""
+    own = f"{SPOOL_FILE}.{os.getpid()}"
+    claimed = []
+    try:
+        os.rename(SPOOL_FILE, own)
+        claimed.append(own)
+    except OSError:
+        pass
+
+    # A flush killed mid-way leaves spool.jsonl.<pid> behind: adopt it
+    prefix = os.path.basename(SPOOL_FILE) + "."
+    try:
+        names = os.listdir(MEMORY_DIR)
+    except OSError:
+        names = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        suffix = name[len(prefix):]
+        owner = suffix.split(".")[0]
+        if not owner.isdigit() or int(owner) == os.getpid() or _pid_alive(int(owner)):
+            continue
+        # Keep the whole suffix: a dead flush may hold several claims
+        # (its own and ones it adopted), and they must not collide
+        adopted = f"{own}.{suffix}"
+        try:
+            os.rename(os.path.join(MEMORY_DIR, name), adopted)
+        except OSError:
+            continue  # another flush got there first
+        claimed.append(adopted)
+    return claimed
+
+
+def flush_spool(post=api_post):
+    """Send spooled messages in batches. Returns (stored, duplicates, left).
+
+    The spool is renamed away first, so concurrent invocations never send the
+    same file twice and new messages keep landing in a fresh spool. Claims
+    left by a flush that was killed are picked up once their process is gone.
+    Each message carries the id it was spooled with, so a batch that reached
+    the server but whose reply got lost is skipped as a duplicate on retry.
+    """
+    claimed = _claim_spools()
+    if not claimed:
+        return 0, 0, 0
+
+    from datetime import datetime
+
+    # Drop re-sends (same text seconds apart, e.g. hook retries) before they
+    # hit the wire. Genuine repeats further apart go through; the server
+    # folds those within its own window.
+    messages = []
+    last_spooled = {}
+    for path in claimed:
+        for m in _read_spool(path):
+            if not m.get("text"):
+                continue
+            try:
+                ts = datetime.fromisoformat(m.get("timestamp", "")).timestamp()
+            except (TypeError, ValueError):
+                ts = None
+            prev = last_spooled.get(m["text"])
+            if ts is not None and prev is not None and abs(ts - prev) <= RESEND_WINDOW:
+                continue
+            if ts is not None:
+                last_spooled[m["text"]] = ts
+            messages.append(m)
+
+    stored = duplicates = 0
+    sent = 0
+    try:
+        while sent < len(messages):
+            result = api_batch(messages[sent:sent + SPOOL_BATCH], post=post)
+            stored += result.get("stored", 0)
+            duplicates += result.get("duplicates", 0)
+            sent += SPOOL_BATCH
+    except Exception:
+        mark_offline()
+    finally:
+        left = messages[sent:]
+        if left:
+            with open(SPOOL_FILE, "a") as f:
+                for m in left:
+                    f.write(json.dumps(m, ensure_ascii=False) + "\n")
+        for path in claimed:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    return stored, duplicates, len(left)
+
+
+def flush_in_background():
+    """Replay the spool from a detached ``charles flush`` so the caller
+    (usually the prompt hook) doesn't wait on it."""
+    import subprocess
+
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "flush"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
     )
-    response.raise_for_status()
-    return response.json()
 
 
 def api_forget(query):
     """Send forget request to Charles API."""
-    response = requests.post(
-        f"{API_URL}/forget",
-        json={"query": query},
-        timeout=10,
-    )
-    response.raise_for_status()
-    return response.json()
+    return api_post("/forget", {"query": query}, timeout=10)
 
 
 def forget(query):
@@ -109,32 +341,235 @@ def forget(query):
         print(f'Forgot {forgotten} memory{"s" if forgotten > 1 else ""} about "{query}"')
 
 
+class Relay:
+    """Long-lived local process holding one keep-alive connection to the API.
+
+    The CLI hands messages over ``~/.charles/relay.sock``; fire-and-forget
+    sends are acked as soon as they're queued, so an invocation costs a
+    Unix socket round trip instead of a TCP + TLS handshake.
+    """
+
+    def __init__(self):
+        import queue
+        import threading
+
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.conn = None
+        self.base = ""
+
+    def post(self, path, payload, timeout=35):
+        import http.client
+
+        with self.lock:
+            for attempt in (0, 1):
+                if self.conn is None or self.conn.sock is None:
+                    # First use, or the server closed the last connection
+                    self.close()
+                    self.conn, self.base = _connect(API_URL)
+                try:
+                    return _post_json(self.conn, self.base + path, payload, timeout=timeout)
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    # Server dropped the idle keep-alive connection; reconnect once
+                    self.close()
+                    if attempt:
+                        raise
+                except Exception:
+                    self.close()
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def deliver(self, payload):
+        """Send one message, spooling it if the API is unreachable."""
+        if is_offline():
+            spool(payload["text"])
+            return {"queued": True}
+        try:
+            result = api_message(payload, post=self.post)
+        except Exception:
+            spool(payload["text"])
+            mark_offline()
+            return {"queued": True}
+        mark_online()
+        return result
+
+    def work(self):
+        import queue
+
+        while True:
+            try:
+                payload = self.queue.get(timeout=OFFLINE_BACKOFF)
+            except queue.Empty:
+                payload = None
+            if payload is not None:
+                self.deliver(payload)
+            if os.path.exists(SPOOL_FILE) and not is_offline():
+                flush_spool(post=self.post)
+
+    def serve(self):
+        import socket
+        import socketserver
+        import threading
+
+        relay = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                except ValueError:
+                    return
+                payload = request["payload"]
+                if request.get("wait"):
+                    result = relay.deliver(payload)
+                else:
+                    relay.queue.put(payload)
+                    result = {"queued": False}
+                self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+
+        os.makedirs(MEMORY_DIR, exist_ok=True)
+        if os.path.exists(RELAY_SOCKET):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(RELAY_SOCKET)
+                print(f"Relay already running on {RELAY_SOCKET}")
+                return
+            except OSError:
+                os.unlink(RELAY_SOCKET)
+            finally:
+                probe.close()
+
+        server = socketserver.ThreadingUnixStreamServer(RELAY_SOCKET, Handler)
+        os.chmod(RELAY_SOCKET, 0o600)
+        threading.Thread(target=self.work, daemon=True).start()
+        print(f"Relaying {RELAY_SOCKET} -> {API_URL}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.unlink(RELAY_SOCKET)
+            self.close()
+
+
+def relay_send(payload, wait):
+    """Hand a message to the local relay. Returns its reply, or None if no relay runs."""
+    if not os.path.exists(RELAY_SOCKET):
+        return None
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(40 if wait else 1)
+    try:
+        sock.connect(RELAY_SOCKET)
+    except OSError:
+        sock.close()
+        return None
+    with sock:
+        sock.sendall(json.dumps({"payload": payload, "wait": wait}).encode("utf-8") + b"\n")
+        return json.loads(sock.makefile("rb").readline())
+
+
+def show(result):
+    if result.get("queued"):
+        print("[charles offline — message queued]", file=sys.stderr)
+        return
+    reply = result.get("reply")
+    if reply:
+        print(reply)
+    if result.get("notification_sent"):
+        print("[notification sent to Charles Dana]")
+
+
+def send(text, quiet=False):
+    """Send to the API, or spool and return immediately if it's unreachable.
+
+    Goes through the local relay when one is running. With quiet=True this
+    is fire-and-forget: the reply isn't printed or waited for, and we return
+    as soon as the relay has queued the message or the request is written.
+    Since nobody reads the reply, the server is asked to classify only and
+    skip generating one.
+    """
+    payload = {"text": text}
+    if quiet:
+        payload["tier"] = "classify"
+    try:
+        result = relay_send(payload, wait=not quiet)
+    except (OSError, ValueError):
+        # Relay accepted the connection but didn't answer; don't lose the message
+        spool(text)
+        result = {"queued": True}
+    if result is not None:
+        if not quiet:
+            show(result)
+        return
+
+    if is_offline():
+        spool(text)
+        result = {"queued": True}
+    else:
+        try:
+            # Quiet sends don't read the reply, so don't wait for it either
+            result = api_message(payload, post=api_send if quiet else api_post)
+        except Exception:
+            spool(text)
+            mark_offline()
+            result = {"queued": True}
+        else:
+            mark_online()
+
+    if not quiet or result.get("queued"):
+        show(result)
+    if not result.get("queued") and os.path.exists(SPOOL_FILE):
+        flush_in_background()
+
+
+def local(text):
+    """Remember locally and ask Bedrock directly (explicit --local only)."""
+    memories = load_memories()
+    memories.append({"text": text, "timestamp": _now()})
+    save_memories(memories)
+    print(ask_haiku(text))
+
+
 def main():
-    text = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else sys.stdin.read().strip()
+    # Subcommands only ever come from argv on their own: the hook hands the
+    # prompt over as argv or stdin, and "flush" or "relay" is a perfectly
+    # good prompt
+    if sys.argv[1:] == ["flush"]:
+        stored, duplicates, left = flush_spool()
+        print(f"Flushed {stored} queued message{'s' if stored != 1 else ''}"
+              f" ({duplicates} already stored, {left} still queued)")
+        return
+
+    if sys.argv[1:] == ["relay"]:
+        Relay().serve()
+        return
+
+    args = sys.argv[1:]
+    flags = {a for a in args if a in ("--local", "-q", "--quiet")}
+    args = [a for a in args if a not in flags]
+
+    text = " ".join(args) if args else sys.stdin.read().strip()
 
     if not text:
-        print("Usage: charles <text>")
+        print("Usage: charles [--local | -q] <text> | charles flush | charles relay"
+              " | charles forget <query>")
         sys.exit(1)
 
     if text.startswith("forget "):
         forget(text[7:])
         return
 
-    # Try API first, fall back to local
-    try:
-        result = api_message(text)
-        reply = result.get("reply")
-        if reply:
-            print(reply)
-        if result.get("notification_sent"):
-            print("[notification sent to Charles Dana]")
-    except Exception:
-        # Local fallback: remember + ask Haiku directly
-        memories = load_memories()
-        memories.append({"text": text, "timestamp": datetime.now().isoformat()})
-        save_memories(memories)
-        reply = ask_haiku(text)
-        print(reply)
+    if "--local" in flags:
+        local(text)
+    else:
+        send(text, quiet=bool(flags & {"-q", "--quiet"}))
 
 
 if __name__ == "__main__":
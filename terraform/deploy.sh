@@ -76,6 +76,14 @@ SERVICE
 
 $SSH_CMD 'sudo systemctl daemon-reload && sudo systemctl enable charles && sudo systemctl restart charles'
 
+# Wait until workers have warmed their caches and upstream connections
+echo "-> Waiting for /ready..."
+$SSH_CMD 'for i in $(seq 1 30); do
+    curl -fsS -o /dev/null http://127.0.0.1:8000/ready && echo "   ready" && exit 0
+    sleep 1
+done
+echo "   WARNING: /ready not OK after 30s"'
+
 # Configure nginx (only if SSL not already configured)
 HAS_SSL=$($SSH_CMD 'grep -q ssl_certificate /etc/nginx/sites-enabled/charles 2>/dev/null && echo yes || echo no')
 
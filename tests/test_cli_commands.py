@@ -0,0 +1,75 @@
+"""Prompts that look like subcommands are sent as prompts.
+
+The hook runs ``charles -q`` with the user's prompt as argv or on stdin. A
+prompt of just "relay" or "flush" must be spooled like any other message,
+not start a relay server (which blocks the hook until it's killed) or run
+a flush.
+
+    python -m pytest tests/         # or: python -m unittest discover tests
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+CHARLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "charles.py")
+TIMEOUT = 10
+
+
+class SubcommandWords(unittest.TestCase):
+    def setUp(self):
+        self._home = tempfile.TemporaryDirectory()
+        charles_dir = os.path.join(self._home.name, ".charles")
+        os.makedirs(charles_dir)
+        # API marked down, so a sent prompt lands in the spool
+        offline = os.path.join(charles_dir, "offline")
+        open(offline, "w").close()
+        until = time.time() + 600
+        os.utime(offline, (until, until))
+        self.spool = os.path.join(charles_dir, "spool.jsonl")
+        self.relay_socket = os.path.join(charles_dir, "relay.sock")
+        self.env = dict(os.environ, HOME=self._home.name)
+
+    def tearDown(self):
+        self._home.cleanup()
+
+    def _run(self, args, stdin=""):
+        return subprocess.run(
+            [sys.executable, "-I", "-S", CHARLES, *args],
+            input=stdin, env=self.env, capture_output=True, text=True, timeout=TIMEOUT,
+        )
+
+    def _spooled(self) -> list:
+        with open(self.spool) as f:
+            return [json.loads(line)["text"] for line in f]
+
+    def test_words_are_spooled_as_prompts(self):
+        cases = [
+            (["-q"], "relay"),
+            (["-q"], "flush"),
+            (["-q", "relay"], ""),
+            (["-q", "flush"], ""),
+            ([], "relay\n"),
+            ([], "flush\n"),
+        ]
+        for args, stdin in cases:
+            with self.subTest(args=args, stdin=stdin):
+                result = self._run(args, stdin)
+                self.assertEqual(result.returncode, 0, result.stderr)
+                self.assertNotIn("Flushed", result.stdout)
+        self.assertEqual(self._spooled(), ["relay", "flush"] * 3)
+        self.assertFalse(os.path.exists(self.relay_socket))
+
+    def test_flush_subcommand(self):
+        result = self._run(["flush"])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Flushed 0 queued messages", result.stdout)
+        self.assertFalse(os.path.exists(self.spool))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Cold-start regression check for the CLI's offline spool path.
+
+The prompt hook spawns ``charles -q`` on every prompt, so that path has to
+stay cheap: stdlib only, no network modules when the API is known to be
+down, and little on top of bare interpreter startup.
+
+    python -m pytest tests/         # or: python -m unittest discover tests
+
+CHARLES_STARTUP_BUDGET_MS sets the allowed overhead over ``python -c pass``
+(default 60 ms; best of several runs, so noise mostly cancels out).
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+CHARLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "charles.py")
+BUDGET_MS = float(os.environ.get("CHARLES_STARTUP_BUDGET_MS", "60"))
+RUNS = 7
+
+# Only the network path may pull these in
+NETWORK_MODULES = {"http", "urllib", "ssl", "socket", "socketserver", "email"}
+
+
+class OfflineSpoolStartup(unittest.TestCase):
+    def setUp(self):
+        self._home = tempfile.TemporaryDirectory()
+        self.home = self._home.name
+        charles_dir = os.path.join(self.home, ".charles")
+        os.makedirs(charles_dir)
+        # Back off for the whole test so every run takes the spool path
+        offline = os.path.join(charles_dir, "offline")
+        open(offline, "w").close()
+        until = time.time() + 600
+        os.utime(offline, (until, until))
+        self.spool = os.path.join(charles_dir, "spool.jsonl")
+        self.env = dict(os.environ, HOME=self.home)
+
+    def tearDown(self):
+        self._home.cleanup()
+
+    def _run(self, *args):
+        return subprocess.run(
+            [sys.executable, "-I", "-S", *args],
+            env=self.env, capture_output=True, text=True, check=True,
+        )
+
+    def _best(self, *args) -> float:
+        best = float("inf")
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            self._run(*args)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def test_spools_within_budget(self):
+        baseline = self._best("-c", "pass")
+        elapsed = self._best(CHARLES, "-q", "startup check")
+        overhead_ms = (elapsed - baseline) * 1000
+        self.assertLess(
+            overhead_ms, BUDGET_MS,
+            f"charles -q took {elapsed * 1000:.0f} ms, {overhead_ms:.0f} ms over bare startup",
+        )
+        with open(self.spool) as f:
+            self.assertEqual(len(f.readlines()), RUNS)
+
+    @unittest.skipUnless(hasattr(sys, "stdlib_module_names"), "needs Python 3.10+")
+    def test_imports_stdlib_only(self):
+        stderr = self._run("-X", "importtime", CHARLES, "-q", "import check").stderr
+        imported = set()
+        for line in stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                name = line.rsplit("|", 1)[1].strip()
+                if name and " " not in name:  # skip the header row
+                    imported.add(name.split(".")[0])
+        self.assertTrue(imported, "no -X importtime output")
+
+        third_party = {m for m in imported if m not in sys.stdlib_module_names}
+        self.assertFalse(third_party, f"non-stdlib imports on the spool path: {sorted(third_party)}")
+        network = imported & NETWORK_MODULES
+        self.assertFalse(network, f"network modules imported while offline: {sorted(network)}")
+
+
+if __name__ == "__main__":
+    unittest.main()